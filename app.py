@@ -4,30 +4,53 @@ Preserves all PDF formatting including fonts, sizes, colors, styles, images, tab
 """
 
 import os
+import atexit
 import base64
+import gc
+import hashlib
+import html
+import json
+import mmap
+import re
+import tempfile
+import threading
+import time
 from pathlib import Path
 import uuid
+import numpy as np
 import streamlit as st
 from streamlit import components
 from dotenv import load_dotenv
 import logging
 
-from pdf2zh.high_level import translate_stream, download_remote_fonts
-from pdf2zh.doclayout import OnnxModel, ModelInstance
-from pdf2zh.translator import AzureOpenAITranslator
+try:
+    from pybase64 import b64encode_as_string  # SIMD accelerated encoder
+except ImportError:
+    def b64encode_as_string(data):
+        return base64.b64encode(data).decode("ascii")
 
-# Load environment variables
+# Load environment variables before pdf2zh, which reads some (PDF2ZH_NUMBA) at import
 load_dotenv()
 
+from pdf2zh.high_level import translate_stream, download_remote_fonts
+from pdf2zh.doclayout import OnnxModel, ModelInstance, preferred_providers
+from pdf2zh.translator import AzureOpenAITranslator, get_async_azure_client, run_async
+
+
+# A value wrapped in a matching pair of quotes
+_QUOTED_RE = re.compile(r"""(["'])(.*)\1""", re.DOTALL)
+_URL_KEYS = frozenset({"AZURE_OPENAI_BASE_URL", "AZURE_OPENAI_ENDPOINT"})
+
 
 def get_env_var(key, default=""):
     """Get environment variable and strip quotes if present."""
     value = os.getenv(key, default)
-    if isinstance(value, str) and len(value) >= 2:
-        if (value.startswith('"') and value.endswith('"')) or (value.startswith("'") and value.endswith("'")):
-            value = value[1:-1]
-    if key in ["AZURE_OPENAI_BASE_URL", "AZURE_OPENAI_ENDPOINT"] and value.endswith("/"):
-        value = value.rstrip("/")
+    if isinstance(value, str):
+        match = _QUOTED_RE.fullmatch(value)
+        if match:
+            value = match.group(2)
+        if key in _URL_KEYS:
+            value = value.rstrip("/")
     return value
 
 
@@ -41,7 +64,7 @@ logging.getLogger("httpcore").setLevel("CRITICAL")
 for key, default in {
     "translated_pdf": None,
     "original_pdf": None,
-    "original_filename": "",
+    "original_digest": "",
     "translation_progress": 0,
     "translation_status": "",
     "auth_ok": False,
@@ -161,6 +184,19 @@ st.markdown("""
     .stDownloadButton button:hover {
         background: linear-gradient(135deg, #15304f 0%, #245178 100%) !important;
     }
+    a.pdf-download {
+        display: block;
+        text-align: center;
+        text-decoration: none;
+        background: linear-gradient(135deg, #1e3a5f 0%, #2d5f8a 100%);
+        color: white !important;
+        border-radius: 8px;
+        padding: 0.6rem 1.2rem;
+        font-weight: 600;
+    }
+    a.pdf-download:hover {
+        background: linear-gradient(135deg, #15304f 0%, #245178 100%);
+    }
 
     /* Progress section */
     .progress-section {
@@ -198,7 +234,17 @@ st.markdown("""
 def load_model():
     """Load and cache the ONNX model for document layout detection."""
     try:
-        return OnnxModel.load_available()
+        # Optimized and quantized graphs, kept across restarts of the app
+        cache_dir = get_env_var("PDF2ZH_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "pdf2zh")
+        model = OnnxModel.load_available(
+            cache_dir=cache_dir,
+            providers=preferred_providers(),
+            quantize=get_env_var("PDF2ZH_QUANTIZE") == "1",
+        )
+        # Warm up on a blank US Letter page (72 dpi) so the first real page
+        # doesn't pay for the session's initial allocations
+        model.predict(np.full((792, 612, 3), 255, dtype=np.uint8), imgsz=768)
+        return model
     except Exception as e:
         st.error(f"Error loading ONNX model: {e}")
         return None
@@ -208,12 +254,49 @@ if ModelInstance.value is None:
     st.error("Failed to load document layout model. Please check your installation.")
     st.stop()
 
+
+@st.cache_resource(show_spinner=False)
+def _cached_font(lang: str):
+    """Resolve the font for a target language once per process."""
+    font_path = download_remote_fonts(lang)
+    if font_path is None:
+        # Raise instead of returning so a failed download is not cached
+        raise RuntimeError(f"no font available for '{lang}'")
+    return font_path
+
+
 # Load Azure OpenAI credentials
 azure_endpoint = get_env_var("AZURE_OPENAI_BASE_URL", get_env_var("AZURE_OPENAI_ENDPOINT", ""))
 azure_api_key = get_env_var("AZURE_OPENAI_API_KEY", "")
 deployment_name = get_env_var("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini")
 api_version = get_env_var("AZURE_OPENAI_API_VERSION", "2024-06-01")
 
+
+@st.cache_resource(show_spinner=False)
+def _start_warmup(endpoint, api_key, api_version, deployment, lang):
+    """Fetch the default font and open the Azure connection in the background, once per process."""
+    def warmup():
+        try:
+            _cached_font(lang)
+        except Exception:
+            logging.debug("Font warmup failed", exc_info=True)
+        if not (endpoint and api_key and deployment):
+            return
+        try:
+            client = get_async_azure_client(endpoint, api_key, api_version)
+            run_async(client.chat.completions.create(
+                model=deployment,
+                messages=[{"role": "user", "content": "."}],
+                max_tokens=1,
+            ))
+        except Exception:
+            logging.debug("Azure OpenAI warmup failed", exc_info=True)
+
+    threading.Thread(target=warmup, name="warmup", daemon=True).start()
+
+
+_start_warmup(azure_endpoint, azure_api_key, api_version, deployment_name, "hi")  # sidebar's default target language
+
 # ─── Sidebar ───────────────────────────────────────────────────────────────────
 
 with st.sidebar:
@@ -296,10 +379,20 @@ with st.sidebar:
         st.divider()
 
         st.markdown("**Advanced**")
-        threads = st.slider("Translation Threads", 1, 8, 4, help="Parallel threads for faster translation")
+        threads = st.slider("Translation Threads", 1, 8, 4, help="Concurrency level; each thread keeps up to 4 requests in flight")
         skip_subset_fonts = st.checkbox("Skip Font Subsetting", value=False, help="May increase file size but improve compatibility")
+        group_segments = st.checkbox(
+            "Group Segments per Request",
+            value=False,
+            help="Send up to 32 text segments of a page per request as a JSON list. Far fewer requests; segments are resent one by one if a reply can't be parsed.",
+        )
+        use_batch_api = st.checkbox(
+            "Use Batch API (slower start, cheaper)",
+            value=False,
+            help="Submit all segments as one Azure OpenAI batch job. Requires a Global Batch deployment.",
+        )
     else:
-        lang_in, lang_out, threads, skip_subset_fonts = "en", "hi", 4, False
+        lang_in, lang_out, threads, skip_subset_fonts, group_segments, use_batch_api = "en", "hi", 4, False, False, False
 
     st.divider()
     st.markdown(
@@ -381,75 +474,217 @@ if 0 < st.session_state.translation_progress < 1:
     st.caption(f"Progress: {st.session_state.translation_progress * 100:.0f}%")
 
 
+# ─── PDF Storage ───────────────────────────────────────────────────────────────
+
+# Streamlit serves this folder at /app/static/ when server.enableStaticServing is on.
+# That is opt-in: files there are public and bypass the password gate.
+STATIC_DIR = Path(__file__).parent / "static"
+
+
+# Seconds a session's PDFs outlive its last rerun before they are swept
+TEMP_PDF_TTL = int(get_env_var("TEMP_PDF_TTL", "3600"))
+TEMP_PDF_PATTERN = re.compile(r"[0-9a-f]{32}-(original|mono|dual)\.pdf")
+
+
+@st.cache_resource
+def _temp_pdfs():
+    """Process-wide registry of spilled PDFs (file name -> path) swept by `sweep_temp_pdfs`.
+
+    PDFs left behind by an earlier process that was killed are adopted on
+    startup, so the TTL sweep removes them too.
+    """
+    paths = {}
+    for folder in {STATIC_DIR, Path(tempfile.gettempdir())}:
+        if folder.is_dir():
+            for path in folder.glob("*.pdf"):
+                if TEMP_PDF_PATTERN.fullmatch(path.name):
+                    paths[path.name] = str(path)
+    return paths
+
+
+@st.cache_resource
+def _written_pdfs():
+    """Paths this process wrote, removed when the server exits.
+
+    Adopted files are left out: another process of the app sharing the folder
+    may still be serving them.
+    """
+    paths = set()
+
+    def cleanup():
+        for path in list(paths):
+            Path(path).unlink(missing_ok=True)
+
+    atexit.register(cleanup)
+    return paths
+
+
+@st.cache_resource
+def _pdf_dir():
+    """Where session PDFs are written: the static folder if Streamlit serves it, else the temp dir."""
+    if st.get_option("server.enableStaticServing"):
+        try:
+            STATIC_DIR.mkdir(exist_ok=True)
+            if os.access(STATIC_DIR, os.W_OK):
+                return STATIC_DIR
+        except OSError:
+            pass
+        logging.warning(f"{STATIC_DIR} is not writable, previews will be inlined")
+    return Path(tempfile.gettempdir())
+
+
+def save_temp_pdf(data: bytes, suffix: str) -> str:
+    """Write PDF bytes to a temp file and return its path, so session state stays small."""
+    path = _pdf_dir() / f"{uuid.uuid4().hex}-{suffix}.pdf"
+    path.write_bytes(data)
+    _temp_pdfs()[path.name] = str(path)
+    _written_pdfs().add(str(path))
+    return str(path)
+
+
+def discard_temp_pdfs(*paths):
+    """Delete temp PDFs that are no longer referenced by the session."""
+    registry, written = _temp_pdfs(), _written_pdfs()
+    for path in paths:
+        if path:
+            Path(path).unlink(missing_ok=True)
+            registry.pop(Path(path).name, None)
+            written.discard(str(path))
+
+
+def touch_temp_pdfs(*paths):
+    """Mark a live session's PDFs as in use; their mtime is what the sweep checks."""
+    for path in paths:
+        if path:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+
+def sweep_temp_pdfs():
+    """Delete PDFs not touched within TEMP_PDF_TTL, i.e. those of ended sessions."""
+    registry = _temp_pdfs()
+    cutoff = time.time() - TEMP_PDF_TTL
+    for name, path in list(registry.items()):
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except OSError:
+            pass
+        discard_temp_pdfs(path)
+
+
+def static_pdf_url(pdf_path: str):
+    """Same-origin URL Streamlit serves the PDF at, or None if it is not in the static folder."""
+    if Path(pdf_path).parent != STATIC_DIR:
+        return None
+    base_path = st.get_option("server.baseUrlPath").strip("/")
+    return "/" + "/".join(filter(None, [base_path, "app/static", Path(pdf_path).name]))
+
+
 # ─── PDF Viewer ────────────────────────────────────────────────────────────────
 
-def render_pdf(title: str, pdf_bytes: bytes):
-    if not pdf_bytes:
+SYNCFUSION_CDN = "https://cdn.syncfusion.com/ej2/26.1.35"
+
+# Loads the Syncfusion runtime at most once per document; every viewer waits on
+# window.__sfReady instead of injecting its own <script> tag.
+SYNCFUSION_LOADER = f"""
+<link rel="stylesheet" href="{SYNCFUSION_CDN}/material.css">
+<script type="text/javascript">
+  window.__sfReady = window.__sfReady || new Promise(function(resolve, reject) {{
+    if (window.ej && ej.pdfviewer && ej.pdfviewer.PdfViewer) {{ resolve(window.ej); return; }}
+    var script = document.createElement("script");
+    script.src = "{SYNCFUSION_CDN}/dist/ej2.min.js";
+    script.onload = function() {{ resolve(window.ej); }};
+    script.onerror = reject;
+    document.head.appendChild(script);
+  }});
+</script>
+"""
+
+
+def render_pdfs(pairs: list[tuple[str, str]]):
+    """Render (title, pdf_path) pairs side by side in one iframe sharing one Syncfusion runtime."""
+    pairs = [(title, path) for title, path in pairs if path and Path(path).exists()]
+    if not pairs:
         return
 
-    b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    container_id = f"pdf-container-{uuid.uuid4().hex}"
     syncfusion_key = os.getenv("SYNCFUSION_LICENSE_KEY", "")
 
+    panels, viewers = [], []
+    for title, pdf_path in pairs:
+        pdf_url, b64 = static_pdf_url(pdf_path), ""
+        if not pdf_url:
+            # Not served by Streamlit, ship the bytes once and hand the viewer a blob URL
+            with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+                b64 = b64encode_as_string(pdf_map)
+        # Derived from the file so identical reruns emit identical HTML and Streamlit
+        # keeps the existing iframe instead of reloading the viewer
+        container_id = f"pdf-container-{Path(pdf_path).stem}"
+        panels.append(f"""
+      <div style="flex: 1 1 0; min-width: 0; border: 1px solid rgba(49, 51, 63, 0.15); border-radius: 10px; overflow: hidden; box-shadow: 0 2px 8px rgba(0,0,0,0.06);">
+        <div style="padding: 10px 14px; background: linear-gradient(135deg, #1e3a5f 0%, #2d5f8a 100%); font-weight: 600; color: white; font-size: 0.9rem;">{title}</div>
+        <div id="{container_id}" style="width: 100%; height: 820px;"></div>
+      </div>""")
+        viewers.append({"containerId": container_id, "url": pdf_url, "b64": b64})
+
     pdf_display = f"""
-    <div style="border: 1px solid rgba(49, 51, 63, 0.15); border-radius: 10px; overflow: hidden; box-shadow: 0 2px 8px rgba(0,0,0,0.06);">
-      <div style="padding: 10px 14px; background: linear-gradient(135deg, #1e3a5f 0%, #2d5f8a 100%); font-weight: 600; color: white; font-size: 0.9rem;">{title}</div>
-      <div id="{container_id}" style="width: 100%; height: 820px;"></div>
+    {SYNCFUSION_LOADER}
+    <div style="display: flex; gap: 2rem;">{"".join(panels)}
     </div>
     <script type="text/javascript">
       (function() {{
-        var b64Data = "{b64}";
+        var viewers = {json.dumps(viewers)};
         var licenseKey = "{syncfusion_key}";
-        var containerId = "{container_id}";
 
-        function initPdfViewer() {{
-          if (!window.ej || !ej.pdfviewer || !ej.pdfviewer.PdfViewer) {{
-            var c = document.getElementById(containerId);
-            if (c) {{
-              c.innerHTML = "<div style='padding: 12px; color: #e63946;'>Failed to load PDF viewer.</div>";
-            }}
-            return;
-          }}
-          try {{
-            if (licenseKey) {{ ej.base.registerLicense(licenseKey); }}
-            ej.pdfviewer.PdfViewer.Inject(
-              ej.pdfviewer.Toolbar, ej.pdfviewer.Magnification, ej.pdfviewer.Navigation,
-              ej.pdfviewer.Print, ej.pdfviewer.TextSelection, ej.pdfviewer.TextSearch,
-              ej.pdfviewer.Annotation, ej.pdfviewer.FormFields, ej.pdfviewer.FormDesigner
-            );
-            var viewer = new ej.pdfviewer.PdfViewer({{
-              enableToolbar: true, enableNavigation: true, enableTextSelection: true,
-              enableAnnotation: true, width: "100%", height: "100%",
-              resourceUrl: "https://cdn.syncfusion.com/ej2/26.1.35/dist/ej2-pdfviewer-lib"
-            }});
-            viewer.appendTo("#" + containerId);
-            viewer.load("data:application/pdf;base64," + b64Data, null);
-          }} catch (e) {{
-            var c = document.getElementById(containerId);
-            if (c) {{ c.innerHTML = "<div style='padding: 12px; color: #e63946;'>Unable to preview PDF. Use the download button.</div>"; }}
+        function pdfSource(item) {{
+          if (item.url) {{
+            // The component iframe is same-origin with the Streamlit page
+            var loc = window.location;
+            try {{ loc = window.parent.location; }} catch (e) {{}}
+            return loc.origin + item.url;
           }}
+          var binary = atob(item.b64);
+          var bytes = new Uint8Array(binary.length);
+          for (var i = 0; i < binary.length; i++) {{ bytes[i] = binary.charCodeAt(i); }}
+          return URL.createObjectURL(new Blob([bytes], {{ type: "application/pdf" }}));
         }}
 
-        function loadSyncfusionResources(callback) {{
-          var link = document.createElement("link");
-          link.rel = "stylesheet";
-          link.href = "https://cdn.syncfusion.com/ej2/26.1.35/material.css";
-          document.head.appendChild(link);
-          var script = document.createElement("script");
-          script.src = "https://cdn.syncfusion.com/ej2/26.1.35/dist/ej2.min.js";
-          script.onload = callback;
-          script.onerror = function() {{
-            var c = document.getElementById(containerId);
-            if (c) {{ c.innerHTML = "<div style='padding: 12px; color: #e63946;'>Failed to load viewer scripts from CDN.</div>"; }}
-          }};
-          document.head.appendChild(script);
+        function showError(containerId, message) {{
+          var c = document.getElementById(containerId);
+          if (c) {{ c.innerHTML = "<div style='padding: 12px; color: #e63946;'>" + message + "</div>"; }}
         }}
 
-        if (!window.ej || !ej.pdfviewer || !ej.pdfviewer.PdfViewer) {{
-          loadSyncfusionResources(initPdfViewer);
-        }} else {{
-          initPdfViewer();
+        function initPdfViewers(ej) {{
+          if (!ej || !ej.pdfviewer || !ej.pdfviewer.PdfViewer) {{
+            viewers.forEach(function(item) {{ showError(item.containerId, "Failed to load PDF viewer."); }});
+            return;
+          }}
+          if (licenseKey) {{ ej.base.registerLicense(licenseKey); }}
+          ej.pdfviewer.PdfViewer.Inject(
+            ej.pdfviewer.Toolbar, ej.pdfviewer.Magnification, ej.pdfviewer.Navigation,
+            ej.pdfviewer.Print, ej.pdfviewer.TextSelection, ej.pdfviewer.TextSearch,
+            ej.pdfviewer.Annotation, ej.pdfviewer.FormFields, ej.pdfviewer.FormDesigner
+          );
+          viewers.forEach(function(item) {{
+            try {{
+              var viewer = new ej.pdfviewer.PdfViewer({{
+                enableToolbar: true, enableNavigation: true, enableTextSelection: true,
+                enableAnnotation: true, width: "100%", height: "100%",
+                resourceUrl: "{SYNCFUSION_CDN}/dist/ej2-pdfviewer-lib"
+              }});
+              viewer.appendTo("#" + item.containerId);
+              viewer.load(pdfSource(item), null);
+            }} catch (e) {{
+              showError(item.containerId, "Unable to preview PDF. Use the download button.");
+            }}
+          }});
         }}
+
+        window.__sfReady.then(initPdfViewers, function() {{
+          viewers.forEach(function(item) {{ showError(item.containerId, "Failed to load viewer scripts from CDN."); }});
+        }});
       }})();
     </script>
     """
@@ -470,7 +705,31 @@ def validate_azure_credentials():
 
 # ─── Translation ───────────────────────────────────────────────────────────────
 
-def translate_pdf(pdf_bytes, azure_endpoint, azure_api_key, deployment_name, api_version, lang_in, lang_out, threads, skip_subset_fonts):
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_translate(pdf_digest, lang_in, lang_out, deployment_name, skip_subset_fonts, service, group_segments, _pdf_data, _envs, _threads, _callback, _font_path=None):
+    """Run translate_stream, reusing the result for an identical document and settings.
+
+    The document is keyed by its content digest; underscore-prefixed arguments
+    are not part of the cache key. group_segments only keys the cache, the
+    group size itself reaches the translator through _envs. On a cache hit the
+    progress callback is never invoked.
+    """
+    return translate_stream(
+        _pdf_data,
+        lang_in=lang_in,
+        lang_out=lang_out,
+        service=service,
+        thread=_threads,
+        callback=_callback,
+        model=ModelInstance.value,
+        envs=_envs,
+        skip_subset_fonts=skip_subset_fonts,
+        ignore_cache=False,
+        font_path=_font_path,
+    )
+
+
+def translate_pdf(pdf_data, pdf_digest, azure_endpoint, azure_api_key, deployment_name, api_version, lang_in, lang_out, threads, skip_subset_fonts, use_batch_api=False, group_segments=False):
     """Translate PDF using Azure OpenAI."""
     try:
         is_valid, error_msg = validate_azure_credentials()
@@ -489,39 +748,48 @@ def translate_pdf(pdf_bytes, azure_endpoint, azure_api_key, deployment_name, api
             "AZURE_OPENAI_API_KEY": azure_api_key,
             "AZURE_OPENAI_MODEL": deployment_name,
             "AZURE_OPENAI_API_VERSION": api_version,
+            "AZURE_OPENAI_GROUP_SIZE": "32" if group_segments else "1",
         }
 
         st.session_state.translation_progress = 0.25
         st.session_state.translation_status = "Downloading language fonts..."
 
+        font_path = None
         try:
-            font_path = download_remote_fonts(lang_out.lower())
-            if font_path is None:
-                st.info("Using default fonts for translation.")
+            font_path = _cached_font(lang_out.lower())
         except Exception as e:
             st.info(f"Font download note: {e}. Using default fonts.")
 
         st.session_state.translation_progress = 0.35
         st.session_state.translation_status = "Translating document (this may take a while)..."
 
+        last_update = 0.0
+
         def progress_callback(tqdm_obj):
+            nonlocal last_update
             if hasattr(tqdm_obj, 'n') and hasattr(tqdm_obj, 'total') and tqdm_obj.total > 0:
-                progress = 0.35 + (tqdm_obj.n / tqdm_obj.total) * 0.55
+                # At most 5 updates a second; the final tick always goes through
+                now = time.monotonic()
+                if now - last_update < 0.2 and tqdm_obj.n < tqdm_obj.total:
+                    return
+                last_update = now
+                fraction = tqdm_obj.n / tqdm_obj.total
+                if getattr(tqdm_obj, "unit", None) == "requests":
+                    # Batch job, runs before the pages are laid out
+                    progress = 0.35 + fraction * 0.3
+                    status = f"Waiting for batch job... Requests {tqdm_obj.n}/{tqdm_obj.total}"
+                else:
+                    start = 0.65 if use_batch_api else 0.35
+                    progress = start + fraction * (0.9 - start)
+                    status = f"Translating... Page {tqdm_obj.n}/{tqdm_obj.total}"
                 st.session_state.translation_progress = min(progress, 0.9)
-                page_info = f"Page {tqdm_obj.n}/{tqdm_obj.total}"
-                st.session_state.translation_status = f"Translating... {page_info}"
-
-        doc_mono_bytes, doc_dual_bytes = translate_stream(
-            pdf_bytes,
-            lang_in=lang_in,
-            lang_out=lang_out,
-            service="azure-openai",
-            thread=threads,
-            callback=progress_callback,
-            model=ModelInstance.value,
-            envs=envs,
-            skip_subset_fonts=skip_subset_fonts,
-            ignore_cache=False,
+                st.session_state.translation_status = status
+
+        doc_mono_bytes, doc_dual_bytes = _cached_translate(
+            pdf_digest, lang_in, lang_out, deployment_name, skip_subset_fonts,
+            "azure-openai-batch" if use_batch_api else "azure-openai", group_segments,
+            _pdf_data=pdf_data, _envs=envs, _threads=threads, _callback=progress_callback,
+            _font_path=font_path,
         )
 
         st.session_state.translation_progress = 1.0
@@ -543,31 +811,61 @@ if translate_button:
     else:
         st.session_state.translation_progress = 0
         st.session_state.translation_status = "Starting translation..."
+        # Drop the previous run's output before starting, so it doesn't overlap the new one in memory
+        if st.session_state.translated_pdf:
+            discard_temp_pdfs(st.session_state.translated_pdf["mono"], st.session_state.translated_pdf["dual"])
+            st.session_state.translated_pdf = None
+        gc.collect()
+        # getvalue() hands back the upload's own bytes object; getbuffer() would force
+        # BytesIO to unshare (copy) it and bytes() of the view would copy it again
+        pdf_data = uploaded_file.getvalue()
+        pdf_digest = hashlib.blake2b(pdf_data, digest_size=16).hexdigest()
         if (
             st.session_state.original_pdf is None
-            or st.session_state.original_filename != uploaded_file.name
+            or st.session_state.original_digest != pdf_digest
         ):
-            pdf_bytes = uploaded_file.read()
-            st.session_state.original_pdf = pdf_bytes
-            st.session_state.original_filename = uploaded_file.name
-        else:
-            pdf_bytes = st.session_state.original_pdf
+            discard_temp_pdfs(st.session_state.original_pdf)
+            st.session_state.original_pdf = save_temp_pdf(pdf_data, "original")
+            st.session_state.original_digest = pdf_digest
 
         result = translate_pdf(
-            pdf_bytes, azure_endpoint, azure_api_key, deployment_name,
-            api_version, lang_in, lang_out, threads, skip_subset_fonts
+            pdf_data, pdf_digest, azure_endpoint, azure_api_key, deployment_name,
+            api_version, lang_in, lang_out, threads, skip_subset_fonts, use_batch_api,
+            group_segments,
         )
 
         if result:
             doc_mono_bytes, doc_dual_bytes = result
             st.session_state.translated_pdf = {
-                "mono": doc_mono_bytes,
-                "dual": doc_dual_bytes,
+                "mono": save_temp_pdf(doc_mono_bytes, "mono"),
+                "dual": save_temp_pdf(doc_dual_bytes, "dual"),
                 "filename": Path(uploaded_file.name).stem
             }
+            # st.cache_data hands out its own copy; it is on disk now
+            del result, doc_mono_bytes, doc_dual_bytes
             st.balloons()
 
 
+# Keep this session's PDFs alive and expire those of sessions that have ended
+touch_temp_pdfs(
+    st.session_state.original_pdf,
+    *(
+        (st.session_state.translated_pdf["mono"], st.session_state.translated_pdf["dual"])
+        if st.session_state.translated_pdf else ()
+    ),
+)
+sweep_temp_pdfs()
+# An idle session may have had its files swept
+if st.session_state.original_pdf and not Path(st.session_state.original_pdf).exists():
+    st.session_state.original_pdf = None
+    st.session_state.original_digest = ""
+if st.session_state.translated_pdf and not (
+    Path(st.session_state.translated_pdf["mono"]).exists()
+    and Path(st.session_state.translated_pdf["dual"]).exists()
+):
+    st.session_state.translated_pdf = None
+
+
 # ─── Preview Section ───────────────────────────────────────────────────────────
 
 st.markdown("---")
@@ -581,33 +879,45 @@ if st.session_state.translated_pdf:
         horizontal=True,
     )
 
-left, right = st.columns(2, gap="large")
-with left:
-    if uploaded_file is not None and st.session_state.original_pdf:
-        render_pdf("Original Document", st.session_state.original_pdf)
+ORIGINAL_PLACEHOLDER = (
+    '<div style="border: 2px dashed #d1d5db; border-radius: 12px; padding: 4rem 2rem; text-align: center; color: #9ca3af;">'
+    '<p style="font-size: 2rem; margin-bottom: 0.5rem;">📄</p>'
+    '<p>Upload a PDF to preview it here</p>'
+    '</div>'
+)
+TRANSLATED_PLACEHOLDER = (
+    '<div style="border: 2px dashed #d1d5db; border-radius: 12px; padding: 4rem 2rem; text-align: center; color: #9ca3af;">'
+    '<p style="font-size: 2rem; margin-bottom: 0.5rem;">🌐</p>'
+    '<p>Translated document will appear here</p>'
+    '</div>'
+)
+
+original_preview = None
+if uploaded_file is not None and st.session_state.original_pdf:
+    original_preview = ("Original Document", st.session_state.original_pdf)
+translated_preview = None
+if st.session_state.translated_pdf:
+    if preview_mode == "Translated (bilingual)":
+        translated_preview = ("Translated Document (Bilingual)", st.session_state.translated_pdf["dual"])
     else:
-        st.markdown(
-            '<div style="border: 2px dashed #d1d5db; border-radius: 12px; padding: 4rem 2rem; text-align: center; color: #9ca3af;">'
-            '<p style="font-size: 2rem; margin-bottom: 0.5rem;">📄</p>'
-            '<p>Upload a PDF to preview it here</p>'
-            '</div>',
-            unsafe_allow_html=True,
-        )
+        translated_preview = ("Translated Document", st.session_state.translated_pdf["mono"])
+
+if original_preview and translated_preview:
+    # One iframe for both documents, so the viewer runtime is loaded only once
+    render_pdfs([original_preview, translated_preview])
+else:
+    left, right = st.columns(2, gap="large")
+    with left:
+        if original_preview:
+            render_pdfs([original_preview])
+        else:
+            st.markdown(ORIGINAL_PLACEHOLDER, unsafe_allow_html=True)
 
-with right:
-    if st.session_state.translated_pdf:
-        if preview_mode == "Translated (bilingual)":
-            render_pdf("Translated Document (Bilingual)", st.session_state.translated_pdf["dual"])
+    with right:
+        if translated_preview:
+            render_pdfs([translated_preview])
         else:
-            render_pdf("Translated Document", st.session_state.translated_pdf["mono"])
-    else:
-        st.markdown(
-            '<div style="border: 2px dashed #d1d5db; border-radius: 12px; padding: 4rem 2rem; text-align: center; color: #9ca3af;">'
-            '<p style="font-size: 2rem; margin-bottom: 0.5rem;">🌐</p>'
-            '<p>Translated document will appear here</p>'
-            '</div>',
-            unsafe_allow_html=True,
-        )
+            st.markdown(TRANSLATED_PLACEHOLDER, unsafe_allow_html=True)
 
 
 # ─── Download Section ─────────────────────────────────────────────────────────
@@ -615,22 +925,29 @@ with right:
 if st.session_state.translated_pdf:
     st.markdown("#### Download")
     col_dl_mono, col_dl_dual = st.columns(2)
-    with col_dl_mono:
-        st.download_button(
-            label="Download Translated PDF",
-            data=st.session_state.translated_pdf["mono"],
-            file_name=f"{st.session_state.translated_pdf['filename']}-translated.pdf",
-            mime="application/pdf",
-            use_container_width=True,
-        )
-    with col_dl_dual:
-        st.download_button(
-            label="Download Bilingual PDF",
-            data=st.session_state.translated_pdf["dual"],
-            file_name=f"{st.session_state.translated_pdf['filename']}-bilingual.pdf",
-            mime="application/pdf",
-            use_container_width=True,
-        )
+    for column, key, label, file_suffix in (
+        (col_dl_mono, "mono", "Download Translated PDF", "translated"),
+        (col_dl_dual, "dual", "Download Bilingual PDF", "bilingual"),
+    ):
+        pdf_path = st.session_state.translated_pdf[key]
+        file_name = f"{st.session_state.translated_pdf['filename']}-{file_suffix}.pdf"
+        pdf_url = static_pdf_url(pdf_path)
+        with column:
+            if pdf_url:
+                # Served from disk by Streamlit; download_button would hold the
+                # bytes in the session's media store on every rerun
+                st.markdown(
+                    f'<a class="pdf-download" href="{pdf_url}" download="{html.escape(file_name)}">{label}</a>',
+                    unsafe_allow_html=True,
+                )
+            else:
+                st.download_button(
+                    label=label,
+                    data=Path(pdf_path).read_bytes(),
+                    file_name=file_name,
+                    mime="application/pdf",
+                    use_container_width=True,
+                )
 
 
 # ─── Footer ───────────────────────────────────────────────────────────────────
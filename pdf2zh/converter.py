@@ -1,4 +1,4 @@
-import concurrent.futures
+import asyncio
 import logging
 import re
 import unicodedata
@@ -16,8 +16,10 @@ from pymupdf import Font
 from tenacity import retry, wait_fixed
 
 from pdf2zh.translator import (
+    AzureOpenAIBatchTranslator,
     AzureOpenAITranslator,
     BaseTranslator,
+    run_async,
 )
 
 log = logging.getLogger(__name__)
@@ -137,11 +139,15 @@ class TranslateConverter(PDFConverterEx):
         service_model = param[1] if len(param) > 1 else None
         if not envs:
             envs = {}
-        # Only Azure OpenAI translator is supported
+        # Only Azure OpenAI translators are supported
         if service_name == AzureOpenAITranslator.name:
             self.translator = AzureOpenAITranslator(lang_in, lang_out, service_model, envs=envs, prompt=prompt, ignore_cache=ignore_cache)
+        elif service_name == AzureOpenAIBatchTranslator.name:
+            self.translator = AzureOpenAIBatchTranslator(lang_in, lang_out, service_model, envs=envs, prompt=prompt, ignore_cache=ignore_cache)
         else:
-            raise ValueError(f"Unsupported translation service: {service_name}. Only 'azure-openai' is supported.")
+            raise ValueError(f"Unsupported translation service: {service_name}. Only 'azure-openai' and 'azure-openai-batch' are supported.")
+        # Requests are network bound, so keep several in flight per "thread"
+        self.translator.request_limit = asyncio.Semaphore(max(thread, 1) * 4)
 
     def receive_layout(self, ltpage: LTPage):
         # 段落
@@ -333,7 +339,7 @@ class TranslateConverter(PDFConverterEx):
         log.debug("\n==========[SSTACK]==========\n")
 
         @retry(wait=wait_fixed(1))
-        def worker(s: str):  # 多线程翻译
+        async def worker(s: str):  # 并发翻译
             if not s.strip() or re.match(r"^\{v\d+\}$", s):  # 空白和公式不翻译
                 return s
             # Skip strings that are only formula placeholders with whitespace
@@ -341,7 +347,7 @@ class TranslateConverter(PDFConverterEx):
             if not stripped:
                 return s
             try:
-                new = self.translator.translate(s)
+                new = await self.translator.atranslate(s)
                 # If translation is empty or whitespace-only, return original
                 if not new or not new.strip():
                     log.warning(f"Empty translation for: {s[:50]}..., using original")
@@ -353,10 +359,11 @@ class TranslateConverter(PDFConverterEx):
                 else:
                     log.exception(e, exc_info=False)
                 raise e
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.thread
-        ) as executor:
-            news = list(executor.map(worker, sstk))
+
+        async def translate_all():
+            return await asyncio.gather(*(worker(s) for s in sstk))
+
+        news = run_async(translate_all())
 
         ############################################################
         # C. 新文档排版
@@ -1,4 +1,5 @@
 import abc
+import logging
 import os.path
 
 import cv2
@@ -21,16 +22,36 @@ from huggingface_hub import hf_hub_download
 
 from pdf2zh.config import ConfigManager
 
+logger = logging.getLogger(__name__)
+
+# Hardware execution providers to try before falling back to the CPU
+PREFERRED_PROVIDERS = [
+    "CUDAExecutionProvider",
+    "DmlExecutionProvider",
+    "CoreMLExecutionProvider",
+    "CPUExecutionProvider",
+]
+
+# Providers whose optimized graph onnxruntime can save; providers that compile
+# nodes of their own (DirectML, CoreML, ...) refuse to serialize the graph
+SERIALIZABLE_PROVIDERS = ("CUDAExecutionProvider", "CPUExecutionProvider")
+
+
+def preferred_providers() -> list[str]:
+    """Execution providers from PREFERRED_PROVIDERS available in this onnxruntime build."""
+    available = onnxruntime.get_available_providers()
+    return [p for p in PREFERRED_PROVIDERS if p in available]
+
 
 class DocLayoutModel(abc.ABC):
     @staticmethod
-    def load_onnx():
-        model = OnnxModel.from_pretrained()
+    def load_onnx(**kwargs):
+        model = OnnxModel.from_pretrained(**kwargs)
         return model
 
     @staticmethod
-    def load_available():
-        return DocLayoutModel.load_onnx()
+    def load_available(**kwargs):
+        return DocLayoutModel.load_onnx(**kwargs)
 
     @property
     @abc.abstractmethod
@@ -70,7 +91,27 @@ class YoloBox:
 
 
 class OnnxModel(DocLayoutModel):
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        cache_dir: str = None,
+        providers: list[str] = None,
+        quantize: bool = False,
+    ):
+        """
+        Args:
+            model_path: Path of the ONNX layout model.
+            cache_dir: Directory to keep derived models in. When set, the
+                hardware-independent part of the graph optimization is saved on
+                first load and reused by later processes (CPU and CUDA only, see
+                SERIALIZABLE_PROVIDERS).
+            providers: Execution providers in order of preference, see
+                `preferred_providers`. Defaults to onnxruntime's choice. If no
+                session can be created with them, the float model is run on
+                the CPU provider.
+            quantize: Run an 8-bit dynamically quantized copy of the model,
+                generated once and cached.
+        """
         self.model_path = model_path
 
         model = onnx.load(model_path)
@@ -78,12 +119,134 @@ class OnnxModel(DocLayoutModel):
         self._stride = ast.literal_eval(metadata["stride"])
         self._names = ast.literal_eval(metadata["names"])
 
-        self.model = onnxruntime.InferenceSession(model.SerializeToString())
+        session_path = model_path
+        if quantize:
+            try:
+                session_path = self.quantized_model_path(
+                    model_path, cache_dir or os.path.dirname(model_path)
+                )
+            except Exception:
+                logger.warning(
+                    "Could not quantize the layout model, using the float model",
+                    exc_info=True,
+                )
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        provider = (providers or onnxruntime.get_available_providers())[0]
+        if cache_dir and provider in SERIALIZABLE_PROVIDERS:
+            optimized_path = self.optimized_model_path(
+                session_path, cache_dir, providers
+            )
+            if not os.path.exists(optimized_path):
+                try:
+                    self._save_optimized(session_path, optimized_path, providers)
+                except Exception:
+                    logger.warning(
+                        f"Could not save optimized model {optimized_path}",
+                        exc_info=True,
+                    )
+            if os.path.exists(optimized_path):
+                try:
+                    self.model = self._load_optimized(optimized_path, providers)
+                    return
+                except Exception:
+                    logger.warning(
+                        f"Ignoring unreadable optimized model {optimized_path}",
+                        exc_info=True,
+                    )
+
+        try:
+            self.model = onnxruntime.InferenceSession(
+                session_path, sess_options, providers=providers
+            )
+        except Exception:
+            if session_path == model_path and providers == ["CPUExecutionProvider"]:
+                raise
+            logger.warning(
+                f"Could not create a session for {session_path} with {providers}, "
+                "falling back to the float model on the CPU",
+                exc_info=True,
+            )
+            sess_options = onnxruntime.SessionOptions()
+            sess_options.graph_optimization_level = (
+                onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            )
+            self.model = onnxruntime.InferenceSession(
+                model_path, sess_options, providers=["CPUExecutionProvider"]
+            )
+
+    @staticmethod
+    def _cache_name(model_path: str) -> str:
+        """File name stem that changes whenever the model file changes."""
+        stat = os.stat(model_path)
+        name, _ = os.path.splitext(os.path.basename(model_path))
+        return f"{name}-{stat.st_size}-{stat.st_mtime_ns}"
+
+    @staticmethod
+    def optimized_model_path(
+        model_path: str, cache_dir: str, providers: list[str] = None
+    ) -> str:
+        """Cache file for the optimized graph, which is specific to the execution provider."""
+        provider = providers[0] if providers else "default"
+        return os.path.join(
+            cache_dir, f"{OnnxModel._cache_name(model_path)}.{provider}.extended.onnx"
+        )
+
+    @staticmethod
+    def quantized_model_path(model_path: str, cache_dir: str) -> str:
+        """Return an 8-bit dynamically quantized copy of the model, creating it if needed."""
+        quantized_path = os.path.join(
+            cache_dir, f"{OnnxModel._cache_name(model_path)}.uint8.onnx"
+        )
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+            # The CPU ConvInteger kernel only takes uint8 weights
+            quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QUInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    @staticmethod
+    def _save_optimized(
+        model_path: str, optimized_path: str, providers: list[str] = None
+    ):
+        """Save the graph optimized up to ORT_ENABLE_EXTENDED.
+
+        Layout optimizations of ORT_ENABLE_ALL depend on the host CPU (e.g.
+        AVX2 vs AVX-512) and a cache dir may be reused on other hardware, so
+        they are left to `_load_optimized`.
+        """
+        os.makedirs(os.path.dirname(optimized_path), exist_ok=True)
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        )
+        tmp_path = f"{optimized_path}.{os.getpid()}.tmp"
+        sess_options.optimized_model_filepath = tmp_path
+        onnxruntime.InferenceSession(model_path, sess_options, providers=providers)
+        os.replace(tmp_path, optimized_path)
+
+    @staticmethod
+    def _load_optimized(optimized_path: str, providers: list[str] = None):
+        sess_options = onnxruntime.SessionOptions()
+        # The portable optimizations are already applied, only the
+        # hardware-specific layout transforms still run here
+        sess_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        return onnxruntime.InferenceSession(
+            optimized_path, sess_options, providers=providers
+        )
 
     @staticmethod
-    def from_pretrained():
+    def from_pretrained(**kwargs):
         pth = get_doclayout_onnx_model_path()
-        return OnnxModel(pth)
+        return OnnxModel(pth, **kwargs)
 
     @property
     def stride(self):
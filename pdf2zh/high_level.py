@@ -25,6 +25,7 @@ from pymupdf import Document, Font
 from pdf2zh.converter import TranslateConverter
 from pdf2zh.doclayout import OnnxModel
 from pdf2zh.pdfinterp import PDFPageInterpreterEx
+from pdf2zh.translator import AzureOpenAIBatchTranslator
 
 from pdf2zh.config import ConfigManager
 from babeldoc.assets.assets import get_font_and_metadata
@@ -67,6 +68,42 @@ def check_files(files: List[str]) -> List[str]:
     return missing_files
 
 
+def layout_mask(xyxy, reserved, h, w):
+    """
+    Rasterize layout boxes into a page-sized class map.
+
+    Cells of box i are set to i + 2, cells of reserved boxes (figures,
+    formulas, ...) to 0 and everything else stays 1. Written in the numba
+    subset so it can be compiled, see PDF2ZH_NUMBA below.
+
+    Args:
+        xyxy: (n, 4) float array of boxes in image coordinates.
+        reserved: (n,) bool array, True for boxes whose content is kept as is.
+        h: Page height in pixels.
+        w: Page width in pixels.
+    """
+    box = np.ones((h, w))
+    for keep in (False, True):  # reserved boxes are painted last and win
+        for i in range(xyxy.shape[0]):
+            if reserved[i] != keep:
+                continue
+            x0 = min(max(int(xyxy[i, 0] - 1), 0), w - 1)
+            y0 = min(max(int(h - xyxy[i, 3] - 1), 0), h - 1)
+            x1 = min(max(int(xyxy[i, 2] + 1), 0), w - 1)
+            y1 = min(max(int(h - xyxy[i, 1] + 1), 0), h - 1)
+            box[y0:y1, x0:x1] = 0 if keep else i + 2
+    return box
+
+
+if os.environ.get("PDF2ZH_NUMBA") == "1":
+    try:
+        from numba import njit
+
+        layout_mask = njit(cache=True, nogil=True)(layout_mask)
+    except ImportError:
+        logger.warning("PDF2ZH_NUMBA=1 but numba is not installed, using the Python layout_mask")
+
+
 def translate_patch(
     inf: BinaryIO,
     pages: Optional[list[int]] = None,
@@ -85,6 +122,7 @@ def translate_patch(
     envs: Dict = None,
     prompt: Template = None,
     ignore_cache: bool = False,
+    batch_collect: bool = False,
     **kwarg: Any,
 ) -> None:
     rsrcmgr = PDFResourceManager()
@@ -106,6 +144,8 @@ def translate_patch(
     )
 
     assert device is not None
+    if batch_collect:
+        device.translator.collecting = True
     obj_patch = {}
     interpreter = PDFPageInterpreterEx(rsrcmgr, device, obj_patch)
     if pages:
@@ -122,7 +162,8 @@ def translate_patch(
             if pages and (pageno not in pages):
                 continue
             progress.update()
-            if callback:
+            # The collecting pass only reports the batch job, see flush
+            if callback and not batch_collect:
                 callback(progress)
             page.pageno = pageno
             pix = doc_zh[page.pageno].get_pixmap()
@@ -131,30 +172,15 @@ def translate_patch(
             )[:, :, ::-1]
             page_layout = model.predict(image, imgsz=int(pix.height / 32) * 32)[0]
             # kdtree 是不可能 kdtree 的，不如直接渲染成图片，用空间换时间
-            box = np.ones((pix.height, pix.width))
-            h, w = box.shape
             vcls = ["abandon", "figure", "isolate_formula", "formula_caption"]
-            for i, d in enumerate(page_layout.boxes):
-                if page_layout.names[int(d.cls)] not in vcls:
-                    x0, y0, x1, y1 = d.xyxy.squeeze()
-                    x0, y0, x1, y1 = (
-                        np.clip(int(x0 - 1), 0, w - 1),
-                        np.clip(int(h - y1 - 1), 0, h - 1),
-                        np.clip(int(x1 + 1), 0, w - 1),
-                        np.clip(int(h - y0 + 1), 0, h - 1),
-                    )
-                    box[y0:y1, x0:x1] = i + 2
-            for i, d in enumerate(page_layout.boxes):
-                if page_layout.names[int(d.cls)] in vcls:
-                    x0, y0, x1, y1 = d.xyxy.squeeze()
-                    x0, y0, x1, y1 = (
-                        np.clip(int(x0 - 1), 0, w - 1),
-                        np.clip(int(h - y1 - 1), 0, h - 1),
-                        np.clip(int(x1 + 1), 0, w - 1),
-                        np.clip(int(h - y0 + 1), 0, h - 1),
-                    )
-                    box[y0:y1, x0:x1] = 0
-            layout[page.pageno] = box
+            xyxy = np.array(
+                [d.xyxy.squeeze() for d in page_layout.boxes], dtype=np.float64
+            ).reshape(-1, 4)
+            reserved = np.array(
+                [page_layout.names[int(d.cls)] in vcls for d in page_layout.boxes],
+                dtype=np.bool_,
+            )
+            layout[page.pageno] = layout_mask(xyxy, reserved, pix.height, pix.width)
             # 新建一个 xref 存放新指令流
             page.page_xref = doc_zh.get_new_xref()  # hack 插入页面的新 xref
             doc_zh.update_object(page.page_xref, "<<>>")
@@ -162,6 +188,8 @@ def translate_patch(
             doc_zh[page.pageno].set_contents(page.page_xref)
             interpreter.process_page(page)
 
+    if batch_collect:
+        device.translator.flush(callback, cancellation_event)
     device.close()
     return obj_patch
 
@@ -182,11 +210,13 @@ def translate_stream(
     prompt: Template = None,
     skip_subset_fonts: bool = False,
     ignore_cache: bool = False,
+    font_path: str = None,
     **kwarg: Any,
 ):
     font_list = [("tiro", None)]
 
-    font_path = download_remote_fonts(lang_out.lower())
+    if font_path is None:
+        font_path = download_remote_fonts(lang_out.lower())
     noto_name = NOTO_NAME
     noto = Font(noto_name, font_path)
     font_list.append((noto_name, font_path))
@@ -229,6 +259,15 @@ def translate_stream(
     fp = io.BytesIO()
 
     doc_zh.save(fp)
+    if service.split(":", 1)[0] == AzureOpenAIBatchTranslator.name:
+        # Dry run on a copy to collect every segment for one Batch API job; the
+        # results land in the translation cache that the real pass reads from.
+        translate_patch(
+            io.BytesIO(fp.getvalue()),
+            **{**locals(), "doc_zh": Document(stream=fp.getvalue())},
+            batch_collect=True,
+        )
+        ignore_cache = False
     obj_patch: dict = translate_patch(fp, **locals())
 
     for obj_id, ops_new in obj_patch.items():
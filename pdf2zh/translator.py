@@ -2,14 +2,21 @@
 Simplified translator module - Azure OpenAI only.
 """
 
+import asyncio
+from asyncio import CancelledError
+import functools
+import json
 import logging
 import os
 import re
+import threading
+import time
 import unicodedata
 from copy import copy
 from string import Template
 from typing import cast
 
+import httpx
 import openai
 
 from pdf2zh.cache import TranslationCache
@@ -27,6 +34,71 @@ def remove_control_characters(s):
     return "".join(ch for ch in s if unicodedata.category(ch)[0] != "C")
 
 
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def run_async(coro):
+    """Run a coroutine on the shared background event loop and wait for it.
+
+    Async clients keep their connection pools bound to the loop they were
+    first used on, so every caller shares one long-lived loop thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="pdf2zh-async", daemon=True
+            ).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+# Retry rate limits and transient network errors with exponential backoff
+api_retry = retry(
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)),
+    stop=stop_after_attempt(100),
+    wait=wait_exponential(multiplier=1, min=1, max=15),
+    before_sleep=lambda retry_state: logger.warning(
+        f"API error, retrying in {retry_state.next_action.sleep} seconds... "
+        f"(Attempt {retry_state.attempt_number}/100)"
+    ),
+)
+
+# Connection pool sizes for the shared Azure OpenAI clients
+AZURE_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=64, max_connections=128)
+
+
+@functools.lru_cache(maxsize=None)
+def get_azure_client(base_url: str, api_key: str, api_version: str) -> openai.AzureOpenAI:
+    """Return the process-wide client for an Azure resource.
+
+    Reusing it across documents keeps connections alive (HTTP/2, so requests
+    are multiplexed) instead of paying a TLS handshake per translation.
+    """
+    return openai.AzureOpenAI(
+        azure_endpoint=base_url,
+        api_version=api_version,
+        api_key=api_key,
+        http_client=httpx.Client(http2=True, limits=AZURE_HTTP_LIMITS, timeout=60),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_async_azure_client(
+    base_url: str, api_key: str, api_version: str
+) -> openai.AsyncAzureOpenAI:
+    """Async counterpart of `get_azure_client`, used on the `run_async` loop."""
+    return openai.AsyncAzureOpenAI(
+        azure_endpoint=base_url,
+        api_version=api_version,
+        api_key=api_key,
+        http_client=httpx.AsyncClient(
+            http2=True, limits=AZURE_HTTP_LIMITS, timeout=60
+        ),
+    )
+
+
 class BaseTranslator:
     """Base class for translators."""
     name = "base"
@@ -82,6 +154,19 @@ class BaseTranslator:
         self.cache.set(text, translation)
         return translation
 
+    async def atranslate(self, text: str, ignore_cache: bool = False) -> str:
+        if not (self.ignore_cache or ignore_cache):
+            cache = self.cache.get(text)
+            if cache is not None:
+                return cache
+
+        translation = await self.ado_translate(text)
+        # Marker recovery retries are rare, keep them off the event loop
+        translation = await asyncio.to_thread(self._postprocess, text, translation)
+
+        self.cache.set(text, translation)
+        return translation
+
     def _postprocess(self, source: str, translation: str) -> str:
         """Validate and fix translation output."""
         if not translation or not source.strip():
@@ -122,6 +207,9 @@ class BaseTranslator:
     def do_translate(self, text: str) -> str:
         raise NotImplementedError
 
+    async def ado_translate(self, text: str) -> str:
+        return await asyncio.to_thread(self.do_translate, text)
+
     def prompt(
         self, text: str, prompt_template: Template | None = None
     ) -> list[dict[str, str]]:
@@ -204,8 +292,15 @@ class AzureOpenAITranslator(BaseTranslator):
         "AZURE_OPENAI_API_KEY": None,
         "AZURE_OPENAI_MODEL": "gpt-4o-mini",
         "AZURE_OPENAI_API_VERSION": "2024-06-01",  # default api version
+        "AZURE_OPENAI_GROUP_SIZE": "1",  # segments per request, >1 sends JSON lists
     }
     CustomPrompt = True
+    # Flush a group once its segments reach this many characters. Indic scripts
+    # can take about 2 output tokens per source character, so this keeps a
+    # grouped reply within max_tokens (4096) with room for the JSON around it.
+    group_chars = 1800
+    group_delay = 0.05  # seconds to wait for more segments before sending a group
+    max_requests = 16  # chat completion requests in flight at once
 
     def __init__(
         self,
@@ -230,14 +325,10 @@ class AzureOpenAITranslator(BaseTranslator):
             "temperature": 0,       # Deterministic output to preserve formula markers
             "max_tokens": 4096,     # Prevent truncation of longer paragraphs
         }
-        self.client = openai.AzureOpenAI(
-            azure_endpoint=base_url,
-            azure_deployment=model,
-            api_version=api_version,
-            api_key=api_key,
-        )
+        # Shared per resource; the deployment is routed from `model` on each call
+        self.client = get_azure_client(base_url, api_key, api_version)
+        self.async_client = get_async_azure_client(base_url, api_key, api_version)
         self.prompttext = prompt
-        self._last_source = ""  # Track source text for postprocessing
         self.add_cache_impact_parameters("temperature", self.options["temperature"])
         self.add_cache_impact_parameters("prompt", self.prompt("", self.prompttext))
         
@@ -246,22 +337,131 @@ class AzureOpenAITranslator(BaseTranslator):
         self.add_cache_impact_parameters("think_filter_regex", think_filter_regex)
         self.think_filter_regex = re.compile(think_filter_regex, flags=re.DOTALL)
 
-    @retry(
-        retry=retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)),
-        stop=stop_after_attempt(100),
-        wait=wait_exponential(multiplier=1, min=1, max=15),
-        before_sleep=lambda retry_state: logger.warning(
-            f"API error, retrying in {retry_state.next_action.sleep} seconds... "
-            f"(Attempt {retry_state.attempt_number}/100)"
-        ),
-    )
+        # Grouping relies on the default prompt, custom prompts are sent one by one
+        self.group_size = 1 if prompt else int(self.envs.get("AZURE_OPENAI_GROUP_SIZE") or 1)
+        self._group_queue: list[tuple[str, asyncio.Future]] = []
+        self._group_timer: asyncio.TimerHandle | None = None
+        self._group_tasks: set[asyncio.Task] = set()
+        # Bounds outgoing requests rather than segments, so queued segments
+        # don't hold a slot while their group is still filling up
+        self.request_limit = asyncio.Semaphore(self.max_requests)
+
+    @api_retry
     def do_translate(self, text) -> str:
-        self._last_source = text
         response = self.client.chat.completions.create(
             model=self.model,
             **self.options,
             messages=self.prompt(text, self.prompttext),
         )
+        return self._clean_content(text, self._response_content(response))
+
+    async def ado_translate(self, text) -> str:
+        if self.group_size <= 1:
+            return await self._ado_translate_one(text)
+        # Queue the segment; it is sent together with the other segments that
+        # arrive within group_delay, up to group_size / group_chars.
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._group_queue.append((text, future))
+        if (
+            len(self._group_queue) >= self.group_size
+            or sum(len(t) for t, _ in self._group_queue) >= self.group_chars
+        ):
+            self._flush_group()
+        elif self._group_timer is None:
+            self._group_timer = loop.call_later(self.group_delay, self._flush_group)
+        return await future
+
+    @api_retry
+    async def _ado_translate_one(self, text) -> str:
+        async with self.request_limit:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                **self.options,
+                messages=self.prompt(text, self.prompttext),
+            )
+        return self._clean_content(text, self._response_content(response))
+
+    def _flush_group(self):
+        if self._group_timer is not None:
+            self._group_timer.cancel()
+            self._group_timer = None
+        items, self._group_queue = self._group_queue, []
+        if items:
+            task = asyncio.ensure_future(self._translate_group(items))
+            self._group_tasks.add(task)
+            task.add_done_callback(self._group_tasks.discard)
+
+    async def _translate_group(self, items: list[tuple[str, asyncio.Future]]):
+        results = await self._group_results([text for text, _ in items])
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _group_results(self, texts: list[str]) -> list:
+        """Translations of texts (or the exception for each), in order."""
+        if len(texts) > 1:
+            try:
+                return await self._ado_translate_group(texts)
+            except _GroupTruncated:
+                # The reply hit max_tokens; halves still save most requests
+                half = len(texts) // 2
+                first, second = await asyncio.gather(
+                    self._group_results(texts[:half]),
+                    self._group_results(texts[half:]),
+                )
+                return first + second
+            except Exception as e:
+                logger.warning(f"Grouped translation of {len(texts)} segments failed ({e}), sending them one by one")
+        return await asyncio.gather(
+            *(self._ado_translate_one(text) for text in texts),
+            return_exceptions=True,
+        )
+
+    @api_retry
+    async def _ado_translate_group(self, texts: list[str]) -> list[str]:
+        async with self.request_limit:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                **self.options,
+                messages=self.group_prompt(texts),
+            )
+        if response.choices and response.choices[0].finish_reason == "length":
+            raise _GroupTruncated(f"reply for {len(texts)} segments hit max_tokens")
+        content = self._response_content(response).strip()
+        # Tolerate a markdown code fence around the JSON
+        content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content)
+        translations = json.loads(content)
+        if (
+            not isinstance(translations, list)
+            or len(translations) != len(texts)
+            or not all(isinstance(t, str) for t in translations)
+        ):
+            raise ValueError("grouped response does not match the request")
+        return [self._clean_content(text, t) for text, t in zip(texts, translations)]
+
+    def group_prompt(self, texts: list[str]) -> list[dict[str, str]]:
+        """Prompt translating several segments at once as a JSON array."""
+        system = self.prompt("")[0]
+        return [
+            system,
+            {
+                "role": "user",
+                "content": (
+                    f"Translate each element of the following JSON array from {self.lang_in} to {self.lang_out}. "
+                    "Reply with only a JSON array of the translated strings, in the same order and with "
+                    "the same number of elements. Every {v*} placeholder must stay in its own element.\n\n"
+                    f"{json.dumps(texts, ensure_ascii=False)}"
+                ),
+            },
+        ]
+
+    @staticmethod
+    def _response_content(response) -> str:
         if not response.choices:
             if hasattr(response, "error"):
                 raise ValueError("Error response from Service", response.error)
@@ -269,6 +469,10 @@ class AzureOpenAITranslator(BaseTranslator):
         content = response.choices[0].message.content
         if not content:
             raise ValueError("Empty content in translation response")
+        return content
+
+    def _clean_content(self, source: str, content: str) -> str:
+        """Strip the artifacts the model sometimes wraps around a translation."""
         content = content.strip()
         content = self.think_filter_regex.sub("", content).strip()
         # Remove common LLM artifacts - prefixes the model sometimes adds
@@ -283,7 +487,7 @@ class AzureOpenAITranslator(BaseTranslator):
         if len(content) > 2 and content[0] == '"' and content[-1] == '"':
             inner = content[1:-1]
             # Only strip if the source didn't have quotes
-            if not (self._last_source and self._last_source.startswith('"')):
+            if not (source and source.startswith('"')):
                 content = inner
         return content
 
@@ -295,3 +499,144 @@ class AzureOpenAITranslator(BaseTranslator):
 
     def get_rich_text_right_placeholder(self, id: int):
         return self.get_formular_placeholder(id + 1)
+
+
+class _GroupTruncated(ValueError):
+    """A grouped reply was cut off at max_tokens."""
+
+
+class AzureOpenAIBatchTranslator(AzureOpenAITranslator):
+    """Azure OpenAI translator that sends segments through the Batch API.
+
+    A document is translated in two passes. During the collecting pass
+    ``translate`` only records cache misses and echoes the source text back;
+    ``flush`` then submits every recorded segment as one batch job and stores
+    the results in the translation cache, so the regular pass that follows is
+    served from the cache. Segments the batch job could not translate fall
+    back to the synchronous chat completion path.
+    """
+    name = "azure-openai-batch"
+    envs = {
+        **AzureOpenAITranslator.envs,
+        "AZURE_OPENAI_BATCH_TIMEOUT": "3600",  # seconds before the job is cancelled
+    }
+    poll_interval = 10  # seconds between batch status checks
+
+    def __init__(self, lang_in, lang_out, model, **kwargs):
+        super().__init__(lang_in, lang_out, model, **kwargs)
+        self.collecting = False
+        self.pending: dict[str, None] = {}  # insertion-ordered set of segments
+        self._pending_lock = threading.Lock()
+
+    def translate(self, text: str, ignore_cache: bool = False) -> str:
+        if not self.collecting:
+            return super().translate(text, ignore_cache)
+        return self._collect(text, ignore_cache)
+
+    async def atranslate(self, text: str, ignore_cache: bool = False) -> str:
+        if not self.collecting:
+            return await super().atranslate(text, ignore_cache)
+        return self._collect(text, ignore_cache)
+
+    def _collect(self, text: str, ignore_cache: bool) -> str:
+        if self.ignore_cache or ignore_cache or self.cache.get(text) is None:
+            with self._pending_lock:
+                self.pending[text] = None
+        return text
+
+    def flush(self, callback=None, cancellation_event=None):
+        """Translate every collected segment in a single batch job.
+
+        Whatever the job returns is cached, even if it failed, expired or ran
+        into AZURE_OPENAI_BATCH_TIMEOUT; the remaining segments are left to the
+        regular pass.
+        """
+        with self._pending_lock:
+            texts, self.pending = list(self.pending), {}
+        self.collecting = False
+        if not texts:
+            return
+
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/chat/completions",
+                    "body": {
+                        "model": self.model,
+                        **self.options,
+                        "messages": self.prompt(text, self.prompttext),
+                    },
+                },
+                ensure_ascii=False,
+            )
+            for i, text in enumerate(texts)
+        ]
+        input_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted batch {batch.id} with {len(texts)} segments")
+
+        deadline = time.monotonic() + float(
+            self.envs.get("AZURE_OPENAI_BATCH_TIMEOUT") or "inf"
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            if cancellation_event and cancellation_event.is_set():
+                self.client.batches.cancel(batch.id)
+                raise CancelledError("task cancelled")
+            if time.monotonic() > deadline:
+                if batch.status == "cancelling":
+                    break
+                logger.warning(f"Batch {batch.id} timed out, cancelling it")
+                batch = self.client.batches.cancel(batch.id)
+                # Give the job a moment to settle and publish its partial output
+                deadline = time.monotonic() + 6 * self.poll_interval
+                continue
+            time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            if callback and counts and counts.total:
+                callback(_BatchProgress(counts.completed, counts.total))
+
+        if batch.status != "completed":
+            logger.warning(f"Batch {batch.id} ended with status {batch.status}")
+        if batch.error_file_id:
+            logger.warning(f"Batch {batch.id} has failed requests, see file {batch.error_file_id}")
+        if not batch.output_file_id:
+            # Nothing translated, the regular pass sends every segment itself
+            return
+
+        output = self.client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            text = texts[int(record["custom_id"])]
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+            if not content:
+                continue
+            translation = self._clean_content(text, content)
+            self.cache.set(text, self._postprocess(text, translation))
+
+
+class _BatchProgress:
+    """tqdm-like progress object passed to callbacks while a batch runs."""
+
+    unit = "requests"  # tqdm's unit for page progress is "it"
+
+    def __init__(self, n: int, total: int):
+        self.n = n
+        self.total = total